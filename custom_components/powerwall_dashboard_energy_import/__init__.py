@@ -3,8 +3,14 @@
 from __future__ import annotations
 
 import logging
+import re
 import zoneinfo
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from itertools import batched
+from types import MappingProxyType
 from typing import Any, cast
 
 # Recorder imports removed - we now use Spook's service instead
@@ -29,6 +35,12 @@ from .influx_client import InfluxClient
 PLATFORMS: list[str] = ["sensor"]
 _LOGGER = logging.getLogger(__name__)
 
+# Entities per recorder.get_statistics call during Teslemetry migration
+MIGRATION_STATISTICS_BATCH_SIZE = 10
+
+# Statistic types copied from recorder statistics into Spook imports
+_STAT_FIELDS = frozenset({"sum", "mean", "min", "max", "state"})
+
 BACKFILL_FIELDS = {
     # Daily sensors (existing - keep for backward compatibility)
     "home_usage_daily": "home",
@@ -164,7 +176,7 @@ async def async_handle_backfill(call: ServiceCall):  # noqa: C901
                 CONF_PW_NAME, entry.entry_id.replace("-", "_")
             )
             # Convert to entity-safe format using Home Assistant's official slugify
-            entry_prefix = slugify(entry_prefix_raw, separator="_")
+            entry_prefix = _slug_pw(entry_prefix_raw)
             _LOGGER.info(
                 "Checking entry %s with raw prefix: %s, entity prefix: %s",
                 entry.entry_id,
@@ -825,6 +837,16 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return unload_ok
 
 
+@dataclass(slots=True, frozen=True)
+class _EntityMigration:
+    """A Teslemetry entity ready to be imported into one of our entities."""
+
+    source: str
+    target: str
+    target_entry: Any
+    statistics: list[dict]
+
+
 async def async_handle_teslemetry_migration(call: ServiceCall):  # noqa: C901
     """Handle the service call to migrate Teslemetry historical statistics."""
     _LOGGER.info("=== TESLEMETRY MIGRATION SERVICE STARTING ===")
@@ -906,7 +928,7 @@ async def async_handle_teslemetry_migration(call: ServiceCall):  # noqa: C901
                     CONF_PW_NAME, entry.entry_id.replace("-", "_")
                 )
                 # Convert to entity-safe format using Home Assistant's official slugify
-                entry_prefix = slugify(entry_prefix_raw, separator="_")
+                entry_prefix = _slug_pw(entry_prefix_raw)
                 _LOGGER.info(
                     "Checking entry %s with raw prefix: %s, entity prefix: %s",
                     entry.entry_id,
@@ -962,76 +984,114 @@ async def async_handle_teslemetry_migration(call: ServiceCall):  # noqa: C901
             )
             return
 
-        # Process each Teslemetry entity
+        # Check all targets for existing statistics before importing anything
+        existing_targets: set[str] = set()
+        if not dry_run and not overwrite_existing:
+            target_ids = list(dict.fromkeys(teslemetry_entities.values()))
+            for target_batch in batched(target_ids, MIGRATION_STATISTICS_BATCH_SIZE):
+                existing, errors = await _batch_get_statistics_with_retry(
+                    hass, target_batch, start_time, end_time
+                )
+                existing_targets.update(existing)
+                for entity_id, e in errors.items():
+                    _LOGGER.debug(
+                        "Could not check existing statistics for %s: %s", entity_id, e
+                    )
+
+        # Migrate a batch of Teslemetry entities at a time, so only one batch of
+        # source statistics is held in memory
         total_migrated = 0
-        for teslemetry_entity_id, our_entity_id in teslemetry_entities.items():
-            _LOGGER.info(
-                "Processing migration: %s → %s", teslemetry_entity_id, our_entity_id
+        for source_batch in batched(
+            teslemetry_entities, MIGRATION_STATISTICS_BATCH_SIZE
+        ):
+            source_statistics, errors = await _batch_get_statistics_with_retry(
+                hass, source_batch, start_time, end_time
             )
+            for entity_id, e in errors.items():
+                _LOGGER.error("Failed to extract statistics for %s: %s", entity_id, e)
 
-            try:
-                # Extract statistics from Teslemetry entity
-                statistics_data = await _extract_teslemetry_statistics(
-                    hass, teslemetry_entity_id, start_time, end_time
+            import_plan: list[_EntityMigration] = []
+            for teslemetry_entity_id in source_batch:
+                our_entity_id = teslemetry_entities[teslemetry_entity_id]
+                _LOGGER.info(
+                    "Processing migration: %s → %s", teslemetry_entity_id, our_entity_id
                 )
 
-                if not statistics_data:
-                    _LOGGER.info("No statistics found for %s", teslemetry_entity_id)
-                    continue
+                try:
+                    statistics_data = source_statistics.get(teslemetry_entity_id)
 
-                _LOGGER.info(
-                    "Extracted %d statistics entries from %s",
-                    len(statistics_data),
-                    teslemetry_entity_id,
-                )
+                    if not statistics_data:
+                        _LOGGER.info("No statistics found for %s", teslemetry_entity_id)
+                        continue
+
+                    _log_recent_statistics(teslemetry_entity_id, statistics_data)
 
-                if dry_run:
                     _LOGGER.info(
-                        "DRY RUN: Would import %d statistics for %s",
+                        "Extracted %d statistics entries from %s",
                         len(statistics_data),
-                        our_entity_id,
+                        teslemetry_entity_id,
                     )
-                    total_migrated += len(statistics_data)
-                    continue
 
-                # Check if target entity exists and has statistics
-                if not overwrite_existing:
-                    existing_stats = await _check_existing_statistics(
-                        hass, our_entity_id, start_time, end_time
-                    )
-                    if existing_stats:
+                    if dry_run:
+                        _LOGGER.info(
+                            "DRY RUN: Would import %d statistics for %s",
+                            len(statistics_data),
+                            our_entity_id,
+                        )
+                        total_migrated += len(statistics_data)
+                        continue
+
+                    # Check if target entity already has statistics
+                    if our_entity_id in existing_targets:
                         _LOGGER.warning(
                             "Target entity %s already has statistics. Use overwrite_existing=true to replace.",
                             our_entity_id,
                         )
                         continue
 
-                # Get target entity metadata
-                target_entity = ent_reg.async_get(our_entity_id)
-                if not target_entity:
-                    _LOGGER.warning(
-                        "Target entity %s not found in registry. Skipping migration.",
-                        our_entity_id,
+                    # Get target entity metadata
+                    target_entity = ent_reg.async_get(our_entity_id)
+                    if not target_entity:
+                        _LOGGER.warning(
+                            "Target entity %s not found in registry. Skipping migration.",
+                            our_entity_id,
+                        )
+                        continue
+
+                    import_plan.append(
+                        _EntityMigration(
+                            teslemetry_entity_id,
+                            our_entity_id,
+                            target_entity,
+                            statistics_data,
+                        )
                     )
+
+                except Exception as e:
+                    _LOGGER.error("Failed to migrate %s: %s", teslemetry_entity_id, e)
                     continue
 
-                # Import statistics using Spook
-                await _import_statistics_via_spook(
-                    hass, our_entity_id, target_entity, statistics_data
-                )
+            # Import statistics using Spook
+            for migration in import_plan:
+                try:
+                    await _import_statistics_via_spook(
+                        hass,
+                        migration.target,
+                        migration.target_entry,
+                        migration.statistics,
+                    )
+                except Exception as e:
+                    _LOGGER.error("Failed to migrate %s: %s", migration.source, e)
+                    continue
 
-                total_migrated += len(statistics_data)
+                total_migrated += len(migration.statistics)
                 _LOGGER.info(
                     "Successfully migrated %d statistics from %s to %s",
-                    len(statistics_data),
-                    teslemetry_entity_id,
-                    our_entity_id,
+                    len(migration.statistics),
+                    migration.source,
+                    migration.target,
                 )
 
-            except Exception as e:
-                _LOGGER.error("Failed to migrate %s: %s", teslemetry_entity_id, e)
-                continue
-
         if dry_run:
             _LOGGER.info(
                 "DRY RUN COMPLETE: Would migrate %d total statistics entries",
@@ -1048,32 +1108,32 @@ async def async_handle_teslemetry_migration(call: ServiceCall):  # noqa: C901
         raise
 
 
-def _get_teslemetry_patterns() -> tuple[list[str], dict[str, str]]:
-    """Get Tesla/Teslemetry entity patterns and mappings."""
-    teslemetry_patterns = [
-        # Home energy patterns
-        "home_energy",
-        "home_consumption",
-        "home_usage",
-        "load",
-        # Solar energy patterns
-        "solar_energy",
-        "solar_production",
-        "solar_generated",
-        "pv",
-        # Battery energy patterns
-        "battery_energy",
-        "battery_charge",
-        "battery_discharge",
-        "powerwall",
-        # Grid energy patterns
-        "grid_energy",
-        "grid_import",
-        "grid_export",
-        "utility",
-    ]
+# Tesla/Teslemetry entity patterns and the target sensor each pattern maps to
+_TESLEMETRY_PATTERNS: tuple[str, ...] = (
+    # Home energy patterns
+    "home_energy",
+    "home_consumption",
+    "home_usage",
+    "load",
+    # Solar energy patterns
+    "solar_energy",
+    "solar_production",
+    "solar_generated",
+    "pv",
+    # Battery energy patterns
+    "battery_energy",
+    "battery_charge",
+    "battery_discharge",
+    "powerwall",
+    # Grid energy patterns
+    "grid_energy",
+    "grid_import",
+    "grid_export",
+    "utility",
+)
 
-    our_entity_patterns = {
+_PATTERN_TO_TARGET: Mapping[str, str] = MappingProxyType(
+    {
         # Daily sensor mappings (existing - keep for backward compatibility)
         "home": "home_usage_daily",
         "home_energy": "home_usage_daily",
@@ -1110,37 +1170,48 @@ def _get_teslemetry_patterns() -> tuple[list[str], dict[str, str]]:
         "grid_import_monthly": "grid_imported_monthly",
         "grid_export_monthly": "grid_exported_monthly",
     }
+)
 
-    return teslemetry_patterns, our_entity_patterns
+
+def _get_teslemetry_patterns() -> tuple[list[str], dict[str, str]]:
+    """Get Tesla/Teslemetry entity patterns and mappings."""
+    return list(_TESLEMETRY_PATTERNS), dict(_PATTERN_TO_TARGET)
+
+
+# Specific Tesla entity patterns checked before the fuzzy pattern table
+_PRIORITY_ENTITY_PATTERNS: tuple[tuple[str, str], ...] = (
+    ("solar_energy", "solar_generated_daily"),
+    ("solar_production", "solar_generated_daily"),
+    ("solar_generated", "solar_generated_daily"),
+    ("grid_export", "grid_exported_daily"),
+    ("grid_import", "grid_imported_daily"),
+    ("battery_charge", "battery_charged_daily"),
+    ("battery_discharge", "battery_discharged_daily"),
+    ("home_energy", "home_usage_daily"),
+    ("home_usage", "home_usage_daily"),
+)
+
+
+@lru_cache(maxsize=32)
+def _compile_entity_prefix(entity_prefix: str) -> re.Pattern[str]:
+    """Compile a comma-separated entity prefix list into one search pattern."""
+    prefixes = (p.strip().lower() for p in entity_prefix.split(","))
+    return re.compile("|".join(re.escape(prefix) for prefix in prefixes))
 
 
 def _match_tesla_entity_to_mapping(
-    entity_id: str, entity_prefix: str | None, our_entity_patterns: dict[str, str]
+    entity_id: str, entity_prefix: str | None, our_entity_patterns: Mapping[str, str]
 ) -> str | None:
     """Match a Tesla entity ID to our entity mapping patterns."""
     entity_lower = entity_id.lower()
 
     # Check entity prefix matching if specified
     if entity_prefix:
-        prefixes = [p.strip().lower() for p in entity_prefix.split(",")]
-        entity_matches = any(prefix in entity_lower for prefix in prefixes)
-        if not entity_matches:
+        if not _compile_entity_prefix(entity_prefix).search(entity_lower):
             return None
 
     # Priority matching - exact matches first
-    priority_patterns = [
-        ("solar_energy", "solar_generated_daily"),
-        ("solar_production", "solar_generated_daily"),
-        ("solar_generated", "solar_generated_daily"),
-        ("grid_export", "grid_exported_daily"),
-        ("grid_import", "grid_imported_daily"),
-        ("battery_charge", "battery_charged_daily"),
-        ("battery_discharge", "battery_discharged_daily"),
-        ("home_energy", "home_usage_daily"),
-        ("home_usage", "home_usage_daily"),
-    ]
-
-    for pattern, mapping in priority_patterns:
+    for pattern, mapping in _PRIORITY_ENTITY_PATTERNS:
         if pattern in entity_lower:
             return mapping
 
@@ -1152,6 +1223,12 @@ def _match_tesla_entity_to_mapping(
     return None
 
 
+@lru_cache(maxsize=128)
+def _slug_pw(name: str) -> str:
+    """Convert a Powerwall name to entity-safe format using HA's slugify."""
+    return slugify(name, separator="_")
+
+
 async def _discover_teslemetry_entities(
     hass: HomeAssistant,
     ent_reg,
@@ -1174,15 +1251,22 @@ async def _discover_teslemetry_entities(
         len(ent_reg.entities),
     )
 
-    teslemetry_patterns, our_entity_patterns = _get_teslemetry_patterns()
+    our_entity_patterns = _PATTERN_TO_TARGET
+
+    # Use the sensor prefix to build our entity IDs
+    sensor_prefix_raw = target_entry.data.get(
+        CONF_PW_NAME, target_entry.entry_id.replace("-", "_")
+    )
+    sensor_prefix = _slug_pw(sensor_prefix_raw)
 
-    # Scan entity registry for potential Teslemetry entities
-    for entity in ent_reg.entities.values():
-        if not entity.entity_id.startswith("sensor."):
+    # Scan entity registry for potential Teslemetry entities. The registry is
+    # keyed by entity_id, so filter on the keys without loading each entry.
+    for entity_id in ent_reg.entities:
+        if not entity_id.startswith("sensor."):
             continue
 
         # Look for Tesla/Teslemetry entities with energy characteristics
-        entity_lower = entity.entity_id.lower()
+        entity_lower = entity_id.lower()
 
         # Check legacy discovery if no entity_prefix specified
         if not entity_prefix:
@@ -1192,21 +1276,15 @@ async def _discover_teslemetry_entities(
 
         # Try to match this entity to our patterns
         our_pattern = _match_tesla_entity_to_mapping(
-            entity.entity_id, entity_prefix, our_entity_patterns
+            entity_id, entity_prefix, our_entity_patterns
         )
 
         if our_pattern:
-            # Use the sensor prefix to build our entity ID
-            sensor_prefix_raw = target_entry.data.get(
-                CONF_PW_NAME, target_entry.entry_id.replace("-", "_")
-            )
-            # Convert to entity-safe format using Home Assistant's official slugify
-            sensor_prefix = slugify(sensor_prefix_raw, separator="_")
             our_entity_id = f"sensor.{sensor_prefix}_{our_pattern}"
-            teslemetry_mapping[entity.entity_id] = our_entity_id
+            teslemetry_mapping[entity_id] = our_entity_id
             _LOGGER.debug(
                 "Mapped Tesla entity: %s -> %s (pattern: %s, sensor_prefix: %s)",
-                entity.entity_id,
+                entity_id,
                 our_entity_id,
                 our_pattern,
                 sensor_prefix,
@@ -1310,11 +1388,11 @@ def _analyze_daily_statistics(day_stats: list[dict], date_str: str) -> None:
 
 
 def _get_statistics_service_data(
-    start_time: str | None, end_time: str | None, entity_id: str
+    start_time: str | None, end_time: str | None, statistic_ids: Sequence[str]
 ) -> dict:
     """Prepare service data for statistics API call."""
     service_data = {
-        "statistic_ids": [entity_id],
+        "statistic_ids": list(statistic_ids),
         "period": "hour",
         "types": ["sum", "mean", "min", "max"],
     }
@@ -1394,99 +1472,98 @@ def _group_statistics_by_date(recent_stats: list[dict]) -> dict:
     return stats_by_date
 
 
-async def _extract_teslemetry_statistics(
-    hass: HomeAssistant,
-    entity_id: str,
-    start_time: str | None = None,
-    end_time: str | None = None,
-) -> list[dict]:
-    """Extract statistics from a Teslemetry entity using recorder.get_statistics."""
-    try:
-        service_data = _get_statistics_service_data(start_time, end_time, entity_id)
-
-        # Call recorder.get_statistics service
-        response = await hass.services.async_call(
-            "recorder",
-            "get_statistics",
-            service_data,
-            blocking=True,
-            return_response=True,
-        )
+def _log_recent_statistics(entity_id: str, filtered_result: list[dict]) -> None:
+    """Log a per-day analysis of the last 72 hours of extracted statistics."""
+    # The analysis only produces debug output, so skip building it otherwise
+    if not _LOGGER.isEnabledFor(logging.DEBUG):
+        return
 
-        _LOGGER.debug("Statistics API response for %s: %s", entity_id, response)
+    recent_stats = _get_recent_statistics(filtered_result)
+    if not recent_stats:
+        return
 
-        # Extract statistics data
-        filtered_result = (
-            _extract_statistics_from_response(response, entity_id) if response else None
-        )
-        if not filtered_result:
-            return []
+    _LOGGER.debug(
+        "=== RECENT TESLEMETRY DATA ANALYSIS (last 72 hours) for %s ===",
+        entity_id,
+    )
+    _LOGGER.debug("Found %d recent statistics entries", len(recent_stats))
 
-        # Analyze patterns in recent data
-        recent_stats = _get_recent_statistics(filtered_result)
+    # Group by day and analyze patterns
+    stats_by_date = _group_statistics_by_date(recent_stats)
 
-        if recent_stats:
-            _LOGGER.debug(
-                "=== RECENT TESLEMETRY DATA ANALYSIS (last 72 hours) for %s ===",
-                entity_id,
-            )
-            _LOGGER.debug("Found %d recent statistics entries", len(recent_stats))
+    # Log daily patterns
+    for date_str, day_stats in sorted(stats_by_date.items()):
+        _analyze_daily_statistics(day_stats, date_str)
 
-            # Group by day and analyze patterns
-            stats_by_date = _group_statistics_by_date(recent_stats)
+    _LOGGER.debug("=== END RECENT DATA ANALYSIS ===")
 
-            # Log daily patterns
-            for date_str, day_stats in sorted(stats_by_date.items()):
-                _analyze_daily_statistics(day_stats, date_str)
 
-            _LOGGER.debug("=== END RECENT DATA ANALYSIS ===")
+async def _batch_get_statistics(
+    hass: HomeAssistant,
+    statistic_ids: Sequence[str],
+    start_time: str | None = None,
+    end_time: str | None = None,
+) -> dict[str, list[dict]]:
+    """Fetch statistics for several entities with one recorder.get_statistics call.
 
-        return filtered_result
+    Returns a dict keyed by statistic_id. Entities without statistics are absent.
+    """
+    if not statistic_ids:
+        return {}
 
-    except Exception as e:
-        _LOGGER.error("Failed to extract statistics for %s: %s", entity_id, e)
-        return []
+    service_data = _get_statistics_service_data(start_time, end_time, statistic_ids)
+
+    response = await hass.services.async_call(
+        "recorder",
+        "get_statistics",
+        service_data,
+        blocking=True,
+        return_response=True,
+    )
 
+    _LOGGER.debug("Statistics API response for %s: %s", statistic_ids, response)
 
-async def _check_existing_statistics(
+    statistics = {}
+    for statistic_id in statistic_ids:
+        result = (
+            _extract_statistics_from_response(response, statistic_id)
+            if response
+            else None
+        )
+        if result:
+            statistics[statistic_id] = result
+    return statistics
+
+
+async def _batch_get_statistics_with_retry(
     hass: HomeAssistant,
-    entity_id: str,
+    statistic_ids: Sequence[str],
     start_time: str | None = None,
     end_time: str | None = None,
-) -> bool:
-    """Check if target entity already has statistics in the specified time range."""
-    try:
-        service_data = {
-            "statistic_ids": [entity_id],
-            "period": "hour",
-            "types": ["sum", "mean", "min", "max"],
-        }
+) -> tuple[dict[str, list[dict]], dict[str, Exception]]:
+    """Fetch statistics for a batch, retrying one entity at a time on failure.
 
-        if start_time:
-            service_data["start_time"] = start_time
-        if end_time:
-            service_data["end_time"] = end_time
-
-        response = await hass.services.async_call(
-            "recorder",
-            "get_statistics",
-            service_data,
-            blocking=True,
-            return_response=True,
-        )
-
-        return bool(
-            response
-            and isinstance(response, dict)
-            and "statistics" in response
-            and isinstance(response["statistics"], dict)
-            and entity_id in response["statistics"]
-            and response["statistics"][entity_id]
+    Returns the statistics found and the error for each entity that failed, so
+    one bad statistic_id does not lose the rest of its batch.
+    """
+    try:
+        return (
+            await _batch_get_statistics(hass, statistic_ids, start_time, end_time),
+            {},
         )
-
     except Exception as e:
-        _LOGGER.debug("Could not check existing statistics for %s: %s", entity_id, e)
-        return False
+        _LOGGER.debug("Batched statistics lookup failed, retrying individually: %s", e)
+
+    statistics: dict[str, list[dict]] = {}
+    errors: dict[str, Exception] = {}
+    for statistic_id in statistic_ids:
+        try:
+            statistics.update(
+                await _batch_get_statistics(hass, [statistic_id], start_time, end_time)
+            )
+        except Exception as e:
+            errors[statistic_id] = e
+    return statistics, errors
 
 
 async def _import_statistics_via_spook(
@@ -1499,20 +1576,9 @@ async def _import_statistics_via_spook(
     # Convert statistics format for Spook import
     spook_stats = []
     for stat in statistics_data:
-        spook_stat = {"start": stat["start"]}
-
         # Include available statistic types
-        if "sum" in stat:
-            spook_stat["sum"] = stat["sum"]
-        if "mean" in stat:
-            spook_stat["mean"] = stat["mean"]
-        if "min" in stat:
-            spook_stat["min"] = stat["min"]
-        if "max" in stat:
-            spook_stat["max"] = stat["max"]
-        if "state" in stat:
-            spook_stat["state"] = stat["state"]
-
+        spook_stat = {k: stat[k] for k in _STAT_FIELDS.intersection(stat)}
+        spook_stat["start"] = stat["start"]
         spook_stats.append(spook_stat)
 
     # Process in batches to avoid exceeding HA's 32KB service call limit
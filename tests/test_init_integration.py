@@ -1,7 +1,7 @@
 """Comprehensive tests for __init__.py integration functions."""
 
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import UTC, datetime, timedelta, timezone
 from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
@@ -14,19 +14,18 @@ from custom_components.powerwall_dashboard_energy_import import (
     DOMAIN,
     PLATFORMS,
     _analyze_daily_statistics,
-    _check_existing_statistics,
     _check_large_jumps,
     _check_missing_hours,
     _check_time_gaps,
     _discover_teslemetry_entities,
     _extract_statistics_from_response,
-    _extract_teslemetry_statistics,
     _get_recent_statistics,
     _get_statistics_service_data,
     _get_teslemetry_patterns,
     _group_statistics_by_date,
     _import_statistics_via_spook,
     _log_first_last_entries,
+    _log_recent_statistics,
     _match_tesla_entity_to_mapping,
     async_get_options_flow,
     async_handle_backfill,
@@ -378,9 +377,11 @@ async def test_migration_dry_run(mock_hass, mock_config_entry, mock_entity_regis
 
     # Mock statistics extraction
     with patch(
-        "custom_components.powerwall_dashboard_energy_import._extract_teslemetry_statistics"
-    ) as mock_extract:
-        mock_extract.return_value = [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]
+        "custom_components.powerwall_dashboard_energy_import._batch_get_statistics"
+    ) as mock_batch:
+        mock_batch.return_value = {
+            "sensor.tesla_home_energy": [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]
+        }
 
         await async_handle_teslemetry_migration(call)
 
@@ -504,6 +505,21 @@ def test_match_tesla_entity_to_mapping():
     assert result == "home_usage_daily"
 
 
+def test_match_tesla_entity_to_mapping_prefix_is_literal():
+    """Test that entity prefixes are matched literally, not as regex."""
+    _, our_patterns = _get_teslemetry_patterns()
+
+    result = _match_tesla_entity_to_mapping(
+        "sensor.myxhome_solar_energy", "my.home", our_patterns
+    )
+    assert result is None
+
+    result = _match_tesla_entity_to_mapping(
+        "sensor.my.home_solar_energy", "other, my.home", our_patterns
+    )
+    assert result == "solar_generated_daily"
+
+
 def test_check_missing_hours():
     """Test _check_missing_hours function."""
     day_stats = [
@@ -566,10 +582,10 @@ def test_analyze_daily_statistics():
 def test_get_statistics_service_data():
     """Test _get_statistics_service_data function."""
     result = _get_statistics_service_data(
-        "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", "sensor.test"
+        "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", ("sensor.a", "sensor.b")
     )
 
-    assert result["statistic_ids"] == ["sensor.test"]
+    assert result["statistic_ids"] == ["sensor.a", "sensor.b"]
     assert result["period"] == "hour"
     assert result["start_time"] == "2024-01-01T00:00:00Z"
     assert result["end_time"] == "2024-01-02T00:00:00Z"
@@ -630,85 +646,22 @@ def test_group_statistics_by_date():
     assert len(result["2024-01-02"]) == 1
 
 
-# Test _extract_teslemetry_statistics
-@pytest.mark.asyncio
-async def test_extract_teslemetry_statistics_success(mock_hass):
-    """Test successful statistics extraction."""
-    # Mock service response
-    mock_response = {
-        "statistics": {
-            "sensor.tesla_home": [
-                {"start": "2024-01-01T00:00:00Z", "sum": 10.0},
-                {"start": "2024-01-01T01:00:00Z", "sum": 15.0},
-            ]
-        }
-    }
-    mock_hass.services.async_call.return_value = mock_response
-
-    result = await _extract_teslemetry_statistics(mock_hass, "sensor.tesla_home")
-
-    assert len(result) == 2
-    assert result[0]["sum"] == 10.0
-
-    # Verify service call
-    mock_hass.services.async_call.assert_called_once()
-    call_args = mock_hass.services.async_call.call_args
-    assert call_args[0][0] == "recorder"
-    assert call_args[0][1] == "get_statistics"
-
-
-@pytest.mark.asyncio
-async def test_extract_teslemetry_statistics_no_data(mock_hass):
-    """Test extraction when no data available."""
-    mock_hass.services.async_call.return_value = {"statistics": {}}
-
-    result = await _extract_teslemetry_statistics(mock_hass, "sensor.tesla_home")
-
-    assert result == []
-
-
-@pytest.mark.asyncio
-async def test_extract_teslemetry_statistics_error(mock_hass):
-    """Test extraction with service error."""
-    mock_hass.services.async_call.side_effect = Exception("Service error")
-
-    result = await _extract_teslemetry_statistics(mock_hass, "sensor.tesla_home")
-
-    assert result == []
-
-
-# Test _check_existing_statistics
-@pytest.mark.asyncio
-async def test_check_existing_statistics_has_data(mock_hass):
-    """Test when entity has existing statistics."""
-    mock_response = {
-        "statistics": {"sensor.test": [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]}
-    }
-    mock_hass.services.async_call.return_value = mock_response
-
-    result = await _check_existing_statistics(mock_hass, "sensor.test")
-
-    assert result is True
-
-
-@pytest.mark.asyncio
-async def test_check_existing_statistics_no_data(mock_hass):
-    """Test when entity has no existing statistics."""
-    mock_hass.services.async_call.return_value = {"statistics": {}}
-
-    result = await _check_existing_statistics(mock_hass, "sensor.test")
-
-    assert result is False
-
-
-@pytest.mark.asyncio
-async def test_check_existing_statistics_error(mock_hass):
-    """Test check with service error."""
-    mock_hass.services.async_call.side_effect = Exception("Service error")
+def test_log_recent_statistics_skipped_without_debug(caplog):
+    """Test the recent-data analysis is only built when debug logging is on."""
+    stats = [{"start": datetime.now(UTC).isoformat(), "sum": 10.0}]
+    logger_name = "custom_components.powerwall_dashboard_energy_import"
 
-    result = await _check_existing_statistics(mock_hass, "sensor.test")
+    with patch(
+        "custom_components.powerwall_dashboard_energy_import._get_recent_statistics",
+        return_value=[],
+    ) as mock_recent:
+        caplog.set_level(logging.INFO, logger=logger_name)
+        _log_recent_statistics("sensor.tesla_test", stats)
+        mock_recent.assert_not_called()
 
-    assert result is False
+        caplog.set_level(logging.DEBUG, logger=logger_name)
+        _log_recent_statistics("sensor.tesla_test", stats)
+        mock_recent.assert_called_once_with(stats)
 
 
 # Test _import_statistics_via_spook
@@ -1189,21 +1142,27 @@ async def test_migration_with_overwrite_and_existing_stats(
         "overwrite_existing": False,  # Don't overwrite
     }
 
-    with (
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._extract_teslemetry_statistics"
-        ) as mock_extract,
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._check_existing_statistics"
-        ) as mock_check,
-    ):
-        mock_extract.return_value = [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]
-        mock_check.return_value = True  # Has existing statistics
+    stats = [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]
+    with patch(
+        "custom_components.powerwall_dashboard_energy_import._batch_get_statistics"
+    ) as mock_batch:
+        # Targets are checked first, then the source statistics are read
+        mock_batch.side_effect = [
+            {"sensor.target_test": stats},
+            {"sensor.tesla_test": stats},
+        ]
 
         await async_handle_teslemetry_migration(call)
 
         # Should skip migration due to existing stats
-        mock_check.assert_called()
+        assert mock_batch.call_count == 2
+        assert list(mock_batch.call_args_list[0].args[1]) == ["sensor.target_test"]
+        import_calls = [
+            call_args
+            for call_args in mock_hass.services.async_call.call_args_list
+            if call_args[0][1] == "import_statistics"
+        ]
+        assert len(import_calls) == 0
 
 
 @pytest.mark.asyncio
@@ -1224,16 +1183,14 @@ async def test_migration_target_entity_not_found(
         "entity_mapping": {"sensor.tesla_test": "sensor.missing_target"},
     }
 
-    with (
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._extract_teslemetry_statistics"
-        ) as mock_extract,
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._check_existing_statistics"
-        ) as mock_check,
-    ):
-        mock_extract.return_value = [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]
-        mock_check.return_value = False
+    with patch(
+        "custom_components.powerwall_dashboard_energy_import._batch_get_statistics"
+    ) as mock_batch:
+        # No existing target statistics, then the source statistics
+        mock_batch.side_effect = [
+            {},
+            {"sensor.tesla_test": [{"start": "2024-01-01T00:00:00Z", "sum": 10.0}]},
+        ]
 
         await async_handle_teslemetry_migration(call)
 
@@ -1242,8 +1199,7 @@ async def test_migration_target_entity_not_found(
 
 
 # Simple tests for date parsing and migration paths
-@pytest.mark.asyncio
-async def test_backfill_end_date_iso_format():
+def test_backfill_end_date_iso_format():
     """Test date parsing with ISO format end dates."""
     # Skip this test - it needs proper mock setup but coverage is already excellent
     pass
@@ -1517,8 +1473,7 @@ async def test_backfill_current_day_limiting():
     assert True
 
 
-@pytest.mark.asyncio
-async def test_backfill_past_day_processing():
+def test_backfill_past_day_processing():
     """Test that backfill processes past days normally."""
     # Simple test to verify past day logic doesn't crash
     from datetime import datetime, timedelta
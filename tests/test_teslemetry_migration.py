@@ -1,122 +1,254 @@
 """Tests for Teslemetry migration functionality."""
 
-from unittest.mock import AsyncMock, Mock, patch
+import copy
+import inspect
+import logging
+import random
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
 
 import pytest
-from homeassistant.core import ServiceCall
+from homeassistant.util import slugify
 
 from custom_components.powerwall_dashboard_energy_import import (
-    _check_existing_statistics,
+    _PATTERN_TO_TARGET,
+    _batch_get_statistics,
     _discover_teslemetry_entities,
-    _extract_teslemetry_statistics,
     _get_teslemetry_patterns,
     _import_statistics_via_spook,
+    _match_tesla_entity_to_mapping,
+    _slug_pw,
     async_handle_teslemetry_migration,
 )
 
+_INTEGRATION = "custom_components.powerwall_dashboard_energy_import"
+
+_SYNTHETIC_TESLA_SUFFIXES = (
+    "home_energy",
+    "solar_energy",
+    "battery_energy_in",
+    "battery_energy_out",
+    "grid_energy_in",
+    "grid_energy_out",
+)
+
+# Code object of the migration service handler, for signature checks
+_MIGRATION_CODE = async_handle_teslemetry_migration.__code__
+
+# Positional parameter names of the migration service handler
+_MIGRATION_PARAMS = _MIGRATION_CODE.co_varnames[: _MIGRATION_CODE.co_argcount]
+
+_EXPECTED_MIGRATION_FIELDS = frozenset(
+    {
+        "auto_discover",
+        "entity_mapping",
+        "start_date",
+        "end_date",
+        "dry_run",
+        "overwrite_existing",
+        "merge_strategy",
+    }
+)
+
+_EXPECTED_SPOOK_DATA = {
+    "statistic_id": "sensor.powerwall_dashboard_home_usage_daily",
+    "source": "recorder",
+    "has_mean": True,
+    "has_sum": True,
+    "unit_of_measurement": "kWh",
+    "name": "Home Usage (Daily)",
+}
+
+_EXPECTED_MAIN_ENTRIES = (
+    ("home_main", "home_usage"),
+    ("solar_main", "solar_generated"),
+    ("battery_charge_main", "battery_charged"),
+    ("battery_discharge_main", "battery_discharged"),
+    ("grid_import_main", "grid_imported"),
+    ("grid_export_main", "grid_exported"),
+)
+
+_EXPECTED_MONTHLY_ENTRIES = (
+    ("home_monthly", "home_usage_monthly"),
+    ("solar_monthly", "solar_generated_monthly"),
+    ("battery_charge_monthly", "battery_charged_monthly"),
+    ("battery_discharge_monthly", "battery_discharged_monthly"),
+    ("grid_import_monthly", "grid_imported_monthly"),
+    ("grid_export_monthly", "grid_exported_monthly"),
+)
+
+_EXPECTED_DAILY_MAPPINGS = (
+    ("home", "home_usage_daily"),
+    ("solar", "solar_generated_daily"),
+    ("battery_charge", "battery_charged_daily"),
+    ("battery_discharge", "battery_discharged_daily"),
+    ("grid_import", "grid_imported_daily"),
+    ("grid_export", "grid_exported_daily"),
+)
+
+
+# Registry entries only expose the attributes the integration reads
+_Entity = namedtuple(
+    "_Entity", ("entity_id", "name", "original_name"), defaults=(None, None)
+)
+
+
+def _make_registry(entities=None):
+    """Create a minimal entity registry exposing entities and async_get."""
+    entities = {} if entities is None else entities
+    return SimpleNamespace(entities=entities, async_get=entities.get)
+
+
+def _make_entry(entry_id, pw_name):
+    """Create a stand-in config entry for the given Powerwall name."""
+    return SimpleNamespace(entry_id=entry_id, data={"pw_name": pw_name})
+
+
+def _add_entities(registry, entity_ids):
+    """Add bare registry entries for the given entity IDs."""
+    for entity_id in entity_ids:
+        registry.entities[entity_id] = _Entity(entity_id)
+
+
+def _service_data(call_args):
+    """Return the service data of a recorded services.async_call call."""
+    # Service data is the third positional argument, or passed as keywords
+    return call_args.args[2] if len(call_args.args) > 2 else call_args.kwargs
+
+
+def _patch_integration(monkeypatch, **attrs):
+    """Replace integration module attributes for the duration of a test."""
+    for name, value in attrs.items():
+        monkeypatch.setattr(f"{_INTEGRATION}.{name}", value)
+
 
 @pytest.fixture
 def mock_hass():
     """Create a mock Home Assistant instance."""
     hass = Mock()
     hass.services = Mock()
+    hass.services.async_call = AsyncMock()
     hass.config_entries = Mock()
+    hass.config = Mock()
     hass.data = {}
     return hass
 
 
 @pytest.fixture
 def mock_service_call(mock_hass):
-    """Create a mock service call for migration."""
-    call = Mock(spec=ServiceCall)
-    call.hass = mock_hass
-    call.data = {
-        "auto_discover": True,
-        "dry_run": False,
-        "overwrite_existing": False,
-        "merge_strategy": "prioritize_influx",
-    }
-    return call
+    """Create a stand-in service call for migration."""
+    # The handler only reads call.hass and call.data
+    return SimpleNamespace(
+        hass=mock_hass,
+        data={
+            "auto_discover": True,
+            "dry_run": False,
+            "overwrite_existing": False,
+            "merge_strategy": "prioritize_influx",
+        },
+    )
+
+
+@pytest.fixture(scope="session")
+def teslemetry_patterns():
+    """Return the Teslemetry pattern tables, built once per session."""
+    return _get_teslemetry_patterns()
 
 
 @pytest.fixture
-def mock_entity_registry():
-    """Create a mock entity registry with sample entities."""
-    registry = Mock()
-
-    # Mock Teslemetry entities
-    teslemetry_entity = Mock()
-    teslemetry_entity.entity_id = "sensor.tesla_site_home_energy"
-    teslemetry_entity.name = "Tesla Home Energy"
-    teslemetry_entity.original_name = "Tesla Home Energy"
-
-    # Mock our integration entities
-    our_entity = Mock()
-    our_entity.entity_id = "sensor.powerwall_dashboard_home_usage_daily"
-    our_entity.name = "Home Usage (Daily)"
-    our_entity.original_name = "Home Usage (Daily)"
-
-    registry.entities = {
-        "sensor.tesla_site_home_energy": teslemetry_entity,
-        "sensor.powerwall_dashboard_home_usage_daily": our_entity,
-    }
+def hass_async_call():
+    """Create a minimal hass exposing only an awaitable services.async_call."""
+    return SimpleNamespace(services=SimpleNamespace(async_call=AsyncMock()))
+
+
+@pytest.fixture
+def sample_stats():
+    """Return fresh hourly recorder statistics rows."""
+    return [
+        {
+            "start": "2024-01-01T00:00:00+00:00",
+            "sum": 15.5,
+            "mean": 0.65,
+            "min": 0.0,
+            "max": 2.5,
+        },
+        {
+            "start": "2024-01-01T01:00:00+00:00",
+            "sum": 31.0,
+            "mean": 0.72,
+            "min": 0.0,
+            "max": 3.0,
+        },
+    ]
 
-    registry.async_get = Mock(
-        side_effect=lambda entity_id: registry.entities.get(entity_id)
+
+@pytest.fixture(scope="session")
+def _registry_entities():
+    """Build the sample registry entries once per session."""
+    entities = (
+        # Teslemetry entities
+        _Entity(
+            "sensor.tesla_site_home_energy",
+            "Tesla Home Energy",
+            "Tesla Home Energy",
+        ),
+        # Our integration entities
+        _Entity(
+            "sensor.powerwall_dashboard_home_usage_daily",
+            "Home Usage (Daily)",
+            "Home Usage (Daily)",
+        ),
     )
+    return {entity.entity_id: entity for entity in entities}
+
 
-    return registry
+@pytest.fixture
+def mock_entity_registry(_registry_entities):
+    """Create a fake entity registry with sample entities."""
+    # Copy the shared entries so tests can add entities without leaking
+    return _make_registry(copy.copy(_registry_entities))
 
 
 def test_migration_service_registration():
     """Test that the migration service can be imported and has correct signature."""
-    import inspect
-
     # Function should exist and be callable
     assert callable(async_handle_teslemetry_migration)
 
-    # Should accept a ServiceCall parameter
-    sig = inspect.signature(async_handle_teslemetry_migration)
-    assert len(sig.parameters) == 1
-    assert "call" in sig.parameters
+    # Should accept a ServiceCall parameter and nothing else
+    assert _MIGRATION_PARAMS == ("call",)
+    assert _MIGRATION_CODE.co_kwonlyargcount == 0
+    assert not _MIGRATION_CODE.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS)
 
 
-@pytest.mark.asyncio
-async def test_migration_requires_spook(mock_hass, mock_service_call):
+async def test_migration_requires_spook(mock_hass, mock_service_call, caplog):
     """Test that migration service fails gracefully when Spook is not available."""
+    caplog.set_level(logging.INFO, logger=_INTEGRATION)
+
     # Setup mocks
     mock_hass.services.has_service = Mock(return_value=False)  # Spook not available
 
-    with patch(
-        "custom_components.powerwall_dashboard_energy_import._LOGGER"
-    ) as mock_logger:
-        await async_handle_teslemetry_migration(mock_service_call)
+    await async_handle_teslemetry_migration(mock_service_call)
 
-        # Verify error was logged about missing Spook
-        mock_logger.error.assert_called_with(
-            "Teslemetry migration requires Spook integration for recorder.import_statistics service. "
-            "Install Spook from https://github.com/frenck/spook or HACS."
-        )
+    # Verify error was logged about missing Spook
+    assert any(
+        "Teslemetry migration requires Spook" in r.message
+        and r.levelno == logging.ERROR
+        for r in caplog.records
+    )
 
 
-@pytest.mark.asyncio
 async def test_discover_teslemetry_entities(mock_hass, mock_entity_registry):
     """Test auto-discovery of Teslemetry entities."""
     # Setup config entries
-    config_entry = Mock()
-    config_entry.entry_id = "test-entry-id"
-    config_entry.data = {"pw_name": "test_pw"}
+    config_entry = _make_entry("test-entry-id", "test_pw")
     mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
 
     # Add more diverse Teslemetry entities to registry
-    solar_entity = Mock()
-    solar_entity.entity_id = "sensor.tesla_site_solar_energy"
-    mock_entity_registry.entities["sensor.tesla_site_solar_energy"] = solar_entity
-
-    battery_entity = Mock()
-    battery_entity.entity_id = "sensor.tesla_site_battery_energy_in"
-    mock_entity_registry.entities["sensor.tesla_site_battery_energy_in"] = (
-        battery_entity
+    _add_entities(
+        mock_entity_registry,
+        ["sensor.tesla_site_solar_energy", "sensor.tesla_site_battery_energy_in"],
     )
 
     # Test legacy discovery (no entity_prefix)
@@ -130,30 +262,24 @@ async def test_discover_teslemetry_entities(mock_hass, mock_entity_registry):
     assert mapping["sensor.tesla_site_home_energy"].endswith("home_usage_daily")
 
 
-@pytest.mark.asyncio
 async def test_discover_teslemetry_entities_with_prefix(
     mock_hass, mock_entity_registry
 ):
     """Test auto-discovery with entity_prefix parameter."""
     # Setup config entries
-    config_entry = Mock()
-    config_entry.entry_id = "test-entry-id"
-    config_entry.data = {"pw_name": "test_pw"}
+    config_entry = _make_entry("test-entry-id", "test_pw")
     mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
 
-    # Add entities with non-standard naming (like user's my_home_* entities)
-    my_home_solar = Mock()
-    my_home_solar.entity_id = "sensor.my_home_solar_generated"
-    mock_entity_registry.entities["sensor.my_home_solar_generated"] = my_home_solar
-
-    my_home_battery = Mock()
-    my_home_battery.entity_id = "sensor.my_home_battery_charge"
-    mock_entity_registry.entities["sensor.my_home_battery_charge"] = my_home_battery
-
-    # Add a Tesla entity that should NOT be found with my_home prefix
-    tesla_entity = Mock()
-    tesla_entity.entity_id = "sensor.tesla_site_grid_import"
-    mock_entity_registry.entities["sensor.tesla_site_grid_import"] = tesla_entity
+    # Add entities with non-standard naming (like user's my_home_* entities),
+    # plus a Tesla entity that should NOT be found with my_home prefix
+    _add_entities(
+        mock_entity_registry,
+        [
+            "sensor.my_home_solar_generated",
+            "sensor.my_home_battery_charge",
+            "sensor.tesla_site_grid_import",
+        ],
+    )
 
     # Test discovery with entity_prefix
     mapping = await _discover_teslemetry_entities(
@@ -171,27 +297,20 @@ async def test_discover_teslemetry_entities_with_prefix(
     assert mapping["sensor.my_home_battery_charge"].endswith("battery_charged_daily")
 
 
-@pytest.mark.asyncio
 async def test_discover_teslemetry_entities_multiple_prefixes(mock_hass):
     """Test auto-discovery with multiple comma-separated prefixes."""
     # Setup config entries
-    config_entry = Mock()
-    config_entry.entry_id = "test-entry-id"
-    config_entry.data = {"pw_name": "test_pw"}
+    config_entry = _make_entry("test-entry-id", "test_pw")
     mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
 
     # Create a fresh entity registry for this test
-    fresh_registry = Mock()
-    fresh_registry.entities = {}
+    fresh_registry = _make_registry()
 
     # Add entities with different prefixes
-    my_home_entity = Mock()
-    my_home_entity.entity_id = "sensor.my_home_solar_generated"
-    fresh_registry.entities["sensor.my_home_solar_generated"] = my_home_entity
-
-    powerwall_entity = Mock()
-    powerwall_entity.entity_id = "sensor.powerwall_battery_discharge"
-    fresh_registry.entities["sensor.powerwall_battery_discharge"] = powerwall_entity
+    _add_entities(
+        fresh_registry,
+        ["sensor.my_home_solar_generated", "sensor.powerwall_battery_discharge"],
+    )
 
     # Test discovery with multiple prefixes
     mapping = await _discover_teslemetry_entities(
@@ -204,26 +323,17 @@ async def test_discover_teslemetry_entities_multiple_prefixes(mock_hass):
     assert "sensor.powerwall_battery_discharge" in mapping
 
 
-@pytest.mark.asyncio
 async def test_discover_with_sensor_prefix(mock_hass, mock_entity_registry):
     """Test that sensor_prefix targets the correct config entry for entity mapping."""
     # Setup multiple config entries with different prefixes
-    config_entry_1 = Mock()
-    config_entry_1.entry_id = "entry-1-id"
-    config_entry_1.data = {"pw_name": "pw001"}
-
-    config_entry_2 = Mock()
-    config_entry_2.entry_id = "entry-2-id"
-    config_entry_2.data = {"pw_name": "pw085"}
-
+    config_entry_1 = _make_entry("entry-1-id", "pw001")
+    config_entry_2 = _make_entry("entry-2-id", "pw085")
     mock_hass.config_entries.async_entries = Mock(
         return_value=[config_entry_1, config_entry_2]
     )
 
     # Add a Tesla entity to map
-    tesla_entity = Mock()
-    tesla_entity.entity_id = "sensor.my_home_grid_exported"
-    mock_entity_registry.entities["sensor.my_home_grid_exported"] = tesla_entity
+    _add_entities(mock_entity_registry, ["sensor.my_home_grid_exported"])
 
     # Test with specific sensor_prefix targeting pw085
     mapping = await _discover_teslemetry_entities(
@@ -237,132 +347,135 @@ async def test_discover_with_sensor_prefix(mock_hass, mock_entity_registry):
     assert mapping["sensor.my_home_grid_exported"] == expected_entity_id
 
 
-@pytest.mark.asyncio
-async def test_extract_teslemetry_statistics():
-    """Test extraction of statistics from Teslemetry entities."""
-    mock_hass = Mock()
-    mock_hass.services.async_call = AsyncMock()
+@pytest.mark.perf
+@pytest.mark.parametrize("n_entities", [100, 1000])
+async def test_discover_teslemetry_entities_large_registry(mock_hass, n_entities):
+    """Test discovery over a large synthetic registry stays linear."""
+    config_entry = _make_entry("test-entry-id", "test_pw")
+    mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
 
-    # Mock response with sample statistics data
-    sample_stats = [
-        {
-            "start": "2024-01-01T00:00:00+00:00",
-            "sum": 15.5,
-            "mean": 0.65,
-            "min": 0.0,
-            "max": 2.5,
-        },
-        {
-            "start": "2024-01-01T01:00:00+00:00",
-            "sum": 31.0,
-            "mean": 0.72,
-            "min": 0.0,
-            "max": 3.0,
-        },
+    # Build a deterministic registry of Tesla entities mixed with the same
+    # number of unrelated sensors, inserted in shuffled order
+    rng = random.Random(0)
+    tesla_ids = [
+        f"sensor.tesla_site_{i:04d}_{rng.choice(_SYNTHETIC_TESLA_SUFFIXES)}"
+        for i in range(n_entities)
     ]
+    other_ids = [f"sensor.room_{i:04d}_temperature" for i in range(n_entities)]
+    entity_ids = tesla_ids + other_ids
+    rng.shuffle(entity_ids)
 
-    mock_hass.services.async_call.return_value = {
+    registry = _make_registry()
+    _add_entities(registry, entity_ids)
+
+    start = time.perf_counter()
+    mapping = await _discover_teslemetry_entities(mock_hass, registry, config_entry)
+    elapsed = time.perf_counter() - start
+
+    assert len(mapping) == n_entities
+    assert set(mapping) == set(tesla_ids)
+
+    # Generous wall-time ceiling; deselect with -m "not perf" on slow machines
+    assert elapsed < 2.0, f"Discovery of {n_entities} entities took {elapsed:.3f}s"
+
+
+async def test_batch_get_statistics_time_range(hass_async_call, sample_stats):
+    """Test the migration time range is passed to recorder.get_statistics."""
+    hass_async_call.services.async_call.return_value = {
         "statistics": {"sensor.tesla_home_energy": sample_stats}
     }
 
-    # Test extraction
-    result = await _extract_teslemetry_statistics(
-        mock_hass,
-        "sensor.tesla_home_energy",
+    result = await _batch_get_statistics(
+        hass_async_call,
+        ["sensor.tesla_home_energy"],
         "2024-01-01T00:00:00+00:00",
         "2024-01-02T00:00:00+00:00",
     )
 
     # Verify service call
-    mock_hass.services.async_call.assert_called_once()
-    call_args = mock_hass.services.async_call.call_args
+    hass_async_call.services.async_call.assert_called_once()
+    call_args = hass_async_call.services.async_call.call_args
 
     # Check positional args
     assert call_args[0][0] == "recorder"
     assert call_args[0][1] == "get_statistics"
 
-    # Check service data - it should be in call_args[0][2] or in kwargs
-    service_data = call_args[0][2] if len(call_args[0]) > 2 else call_args[1]
+    service_data = _service_data(call_args)
     assert service_data["statistic_ids"] == ["sensor.tesla_home_energy"]
     assert service_data["start_time"] == "2024-01-01T00:00:00+00:00"
     assert service_data["end_time"] == "2024-01-02T00:00:00+00:00"
 
     # Verify result
-    assert result == sample_stats
-    assert len(result) == 2
-    assert result[0]["sum"] == 15.5
-
-
-@pytest.mark.asyncio
-async def test_check_existing_statistics():
-    """Test checking for existing statistics in target entities."""
-    mock_hass = Mock()
-    mock_hass.services.async_call = AsyncMock()
-
-    # Mock response indicating existing statistics
-    mock_hass.services.async_call.return_value = {
-        "statistics": {
-            "sensor.powerwall_dashboard_home_usage_daily": [
-                {"start": "2024-01-01T00:00:00+00:00", "sum": 10.0}
-            ]
-        }
-    }
-
-    # Test check for existing statistics
-    has_existing = await _check_existing_statistics(
-        mock_hass, "sensor.powerwall_dashboard_home_usage_daily"
-    )
+    assert result == {"sensor.tesla_home_energy": sample_stats}
+
+
+@pytest.mark.parametrize(
+    ("mock_response", "expected"),
+    [
+        (
+            {
+                "statistics": {
+                    "sensor.powerwall_dashboard_home_usage_daily": [
+                        {"start": "2024-01-01T00:00:00+00:00", "sum": 10.0}
+                    ],
+                    "sensor.powerwall_dashboard_solar_generated_daily": [],
+                }
+            },
+            {
+                "sensor.powerwall_dashboard_home_usage_daily": [
+                    {"start": "2024-01-01T00:00:00+00:00", "sum": 10.0}
+                ]
+            },
+        ),
+        ({}, {}),
+    ],
+)
+async def test_batch_get_statistics(hass_async_call, mock_response, expected):
+    """Test fetching statistics for several entities in one recorder call."""
+    hass_async_call.services.async_call.return_value = mock_response
+    statistic_ids = [
+        "sensor.powerwall_dashboard_home_usage_daily",
+        "sensor.powerwall_dashboard_solar_generated_daily",
+        "sensor.powerwall_dashboard_grid_imported_daily",
+    ]
 
-    assert has_existing is True
+    statistics = await _batch_get_statistics(hass_async_call, statistic_ids)
 
-    # Test with no existing statistics
-    mock_hass.services.async_call.return_value = {}
-    has_existing = await _check_existing_statistics(
-        mock_hass, "sensor.powerwall_dashboard_home_usage_daily"
-    )
+    # One recorder call carries every requested statistic_id
+    hass_async_call.services.async_call.assert_called_once()
+    service_data = _service_data(hass_async_call.services.async_call.call_args)
+    assert service_data["statistic_ids"] == statistic_ids
 
-    assert has_existing is False
+    # Only entities with statistics are present in the result
+    assert statistics == expected
 
 
-@pytest.mark.asyncio
-async def test_import_statistics_via_spook():
+async def test_import_statistics_via_spook(hass_async_call, sample_stats):
     """Test importing statistics using Spook's service."""
-    mock_hass = Mock()
-    mock_hass.services.async_call = AsyncMock()
-
-    mock_entity = Mock()
-    mock_entity.name = "Home Usage (Daily)"
-    mock_entity.original_name = "Home Usage (Daily)"
-
-    sample_stats = [
-        {"start": "2024-01-01T00:00:00+00:00", "sum": 15.5, "mean": 0.65},
-        {"start": "2024-01-01T01:00:00+00:00", "sum": 31.0, "mean": 0.72},
-    ]
+    mock_entity = _Entity(
+        "sensor.powerwall_dashboard_home_usage_daily",
+        "Home Usage (Daily)",
+        "Home Usage (Daily)",
+    )
 
     # Test import
     await _import_statistics_via_spook(
-        mock_hass,
+        hass_async_call,
         "sensor.powerwall_dashboard_home_usage_daily",
         mock_entity,
         sample_stats,
     )
 
     # Verify Spook service call
-    mock_hass.services.async_call.assert_called_once()
-    call_args = mock_hass.services.async_call.call_args
+    hass_async_call.services.async_call.assert_called_once()
+    call_args = hass_async_call.services.async_call.call_args
 
     # Check positional args
     assert call_args[0][0] == "recorder"
     assert call_args[0][1] == "import_statistics"
 
-    # Check service data - it should be in call_args[0][2] or in kwargs
-    service_data = call_args[0][2] if len(call_args[0]) > 2 else call_args[1]
-    assert service_data["statistic_id"] == "sensor.powerwall_dashboard_home_usage_daily"
-    assert service_data["source"] == "recorder"
-    assert service_data["has_mean"] is True
-    assert service_data["has_sum"] is True
-    assert service_data["unit_of_measurement"] == "kWh"
-    assert service_data["name"] == "Home Usage (Daily)"
+    service_data = _service_data(call_args)
+    assert _EXPECTED_SPOOK_DATA.items() <= service_data.items()
 
     # Check converted stats format
     stats = service_data["stats"]
@@ -373,102 +486,202 @@ async def test_import_statistics_via_spook():
     assert stats[0]["mean"] == 0.65
 
 
-@pytest.mark.asyncio
 async def test_full_migration_dry_run(
-    mock_hass, mock_service_call, mock_entity_registry
+    mock_hass,
+    mock_service_call,
+    mock_entity_registry,
+    caplog,
+    monkeypatch,
+    sample_stats,
 ):
     """Test full migration process in dry-run mode."""
+    caplog.set_level(logging.INFO, logger=_INTEGRATION)
+
     # Setup mocks
     mock_hass.services.has_service = Mock(return_value=True)  # Spook available
-    mock_hass.services.async_call = AsyncMock()
     mock_hass.config.time_zone = "America/Denver"  # Mock timezone properly
 
-    # Mock successful statistics extraction
-    sample_stats = [{"start": "2024-01-01T00:00:00+00:00", "sum": 15.5}]
-
     # Setup config entries
-    config_entry = Mock()
-    config_entry.entry_id = "test-entry-id"
+    config_entry = SimpleNamespace(entry_id="test-entry-id")
     mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
 
     # Enable dry run
     mock_service_call.data["dry_run"] = True
 
-    with (
-        patch(
-            "custom_components.powerwall_dashboard_energy_import.async_get_entity_registry",
-            return_value=mock_entity_registry,
+    # Mock discovery returning mapping
+    _patch_integration(
+        monkeypatch,
+        async_get_entity_registry=lambda hass: mock_entity_registry,
+        _discover_teslemetry_entities=AsyncMock(
+            return_value={
+                "sensor.tesla_site_home_energy": (
+                    "sensor.powerwall_dashboard_home_usage_daily"
+                )
+            }
         ),
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._discover_teslemetry_entities"
-        ) as mock_discover,
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._extract_teslemetry_statistics"
-        ) as mock_extract,
-        patch(
-            "custom_components.powerwall_dashboard_energy_import._LOGGER"
-        ) as mock_logger,
-    ):
-        # Mock discovery returning mapping
-        mock_discover.return_value = {
-            "sensor.tesla_site_home_energy": "sensor.powerwall_dashboard_home_usage_daily"
+    )
+
+    # Mock recorder returning one sample row
+    mock_hass.services.async_call.return_value = {
+        "statistics": {"sensor.tesla_site_home_energy": sample_stats[:1]}
+    }
+
+    # Run migration
+    await async_handle_teslemetry_migration(mock_service_call)
+
+    # Dry run only reads the source statistics
+    mock_hass.services.async_call.assert_awaited_once()
+
+    # Verify dry run logging
+    seen = {
+        r.getMessage()
+        for r in caplog.records
+        if r.levelno == logging.INFO and r.msg.startswith("DRY RUN")
+    }
+    assert (
+        "DRY RUN: Would import 1 statistics for "
+        "sensor.powerwall_dashboard_home_usage_daily"
+    ) in seen
+    assert "DRY RUN COMPLETE: Would migrate 1 total statistics entries" in seen
+
+
+async def test_full_migration_batches_recorder_calls(
+    mock_hass,
+    mock_service_call,
+    mock_entity_registry,
+    monkeypatch,
+    sample_stats,
+):
+    """Test that a small migration reads statistics with two recorder calls."""
+    mock_hass.services.has_service = Mock(return_value=True)
+    mock_hass.config.time_zone = "America/Denver"
+    mock_hass.config_entries.async_entries = Mock(
+        return_value=[_make_entry("test-entry-id", "Powerwall Dashboard")]
+    )
+    _add_entities(
+        mock_entity_registry, ["sensor.powerwall_dashboard_solar_generated_daily"]
+    )
+
+    mapping = {
+        "sensor.tesla_site_home_energy": "sensor.powerwall_dashboard_home_usage_daily",
+        "sensor.tesla_site_solar_energy": (
+            "sensor.powerwall_dashboard_solar_generated_daily"
+        ),
+    }
+    mock_hass.services.async_call.return_value = {
+        "statistics": dict.fromkeys(mapping, sample_stats)
+    }
+
+    _patch_integration(
+        monkeypatch,
+        async_get_entity_registry=lambda hass: mock_entity_registry,
+        _discover_teslemetry_entities=AsyncMock(return_value=mapping),
+    )
+    await async_handle_teslemetry_migration(mock_service_call)
+
+    services = [c.args[:2] for c in mock_hass.services.async_call.call_args_list]
+    # Sources and targets are each fetched once, however many entities map
+    assert services.count(("recorder", "get_statistics")) == 2
+    assert services.count(("recorder", "import_statistics")) == len(mapping)
+
+
+async def test_full_migration_reads_sources_in_batches(
+    mock_hass,
+    mock_service_call,
+    mock_entity_registry,
+    monkeypatch,
+    sample_stats,
+):
+    """Test that statistics are read in batches and failures stay per entity."""
+    mock_hass.services.has_service = Mock(return_value=True)
+    mock_hass.config.time_zone = "America/Denver"
+    mock_hass.config_entries.async_entries = Mock(
+        return_value=[_make_entry("test-entry-id", "Powerwall Dashboard")]
+    )
+
+    mapping = {
+        f"sensor.tesla_site_{i}_energy": f"sensor.powerwall_dashboard_target_{i}"
+        for i in range(5)
+    }
+    _add_entities(mock_entity_registry, mapping.values())
+    failing_ids = {"sensor.tesla_site_2_energy", "sensor.powerwall_dashboard_target_1"}
+    existing_target = "sensor.powerwall_dashboard_target_0"
+
+    async def _fake_batch(hass, statistic_ids, start_time=None, end_time=None):
+        if failing_ids.intersection(statistic_ids):
+            raise RuntimeError("recorder unavailable")
+        return {
+            sid: sample_stats
+            for sid in statistic_ids
+            if sid in mapping or sid == existing_target
         }
 
-        # Mock extraction returning sample data
-        mock_extract.return_value = sample_stats
+    batch_stats = AsyncMock(side_effect=_fake_batch)
+    imported = []
 
-        # Run migration
-        await async_handle_teslemetry_migration(mock_service_call)
+    async def _fake_import(hass, entity_id, entity_entry, statistics_data):
+        imported.append(entity_id)
 
-        # Verify dry run logging
-        mock_logger.info.assert_any_call(
-            "DRY RUN: Would import %d statistics for %s",
-            1,
-            "sensor.powerwall_dashboard_home_usage_daily",
-        )
-        mock_logger.info.assert_any_call(
-            "DRY RUN COMPLETE: Would migrate %d total statistics entries", 1
-        )
+    _patch_integration(
+        monkeypatch,
+        MIGRATION_STATISTICS_BATCH_SIZE=2,
+        async_get_entity_registry=lambda hass: mock_entity_registry,
+        _discover_teslemetry_entities=AsyncMock(return_value=mapping),
+        _batch_get_statistics=batch_stats,
+        _import_statistics_via_spook=_fake_import,
+    )
+    await async_handle_teslemetry_migration(mock_service_call)
+
+    lookups = [list(c.args[1]) for c in batch_stats.call_args_list]
+    # A failed batch is retried one entity at a time
+    assert lookups == [
+        ["sensor.powerwall_dashboard_target_0", "sensor.powerwall_dashboard_target_1"],
+        ["sensor.powerwall_dashboard_target_0"],
+        ["sensor.powerwall_dashboard_target_1"],
+        ["sensor.powerwall_dashboard_target_2", "sensor.powerwall_dashboard_target_3"],
+        ["sensor.powerwall_dashboard_target_4"],
+        ["sensor.tesla_site_0_energy", "sensor.tesla_site_1_energy"],
+        ["sensor.tesla_site_2_energy", "sensor.tesla_site_3_energy"],
+        ["sensor.tesla_site_2_energy"],
+        ["sensor.tesla_site_3_energy"],
+        ["sensor.tesla_site_4_energy"],
+    ]
+    # Only the failing source is lost, and the existing target is still protected
+    assert imported == [
+        "sensor.powerwall_dashboard_target_1",
+        "sensor.powerwall_dashboard_target_3",
+        "sensor.powerwall_dashboard_target_4",
+    ]
 
 
-def test_entity_pattern_matching():
-    """Test that entity pattern matching works correctly."""
-    # Test various Teslemetry entity patterns
-    test_cases = [
+@pytest.mark.parametrize(
+    ("teslemetry_entity", "expected_pattern"),
+    [
         ("sensor.tesla_site_home_energy", "home_usage_daily"),
         ("sensor.tesla_site_solar_energy", "solar_generated_daily"),
         ("sensor.tesla_site_battery_energy_in", "battery_charged_daily"),
         ("sensor.tesla_site_battery_energy_out", "battery_discharged_daily"),
         ("sensor.tesla_site_grid_energy_in", "grid_imported_daily"),
         ("sensor.tesla_site_grid_energy_out", "grid_exported_daily"),
-    ]
-
-    # This would be tested by the actual discovery function
-    # Here we just verify the pattern matching logic
-    our_entity_patterns = {
-        "home": "home_usage_daily",
-        "solar": "solar_generated_daily",
-        "battery_energy_in": "battery_charged_daily",
-        "battery_energy_out": "battery_discharged_daily",
-        "grid_energy_in": "grid_imported_daily",
-        "grid_energy_out": "grid_exported_daily",
-    }
-
-    for teslemetry_entity, expected_pattern in test_cases:
-        entity_lower = teslemetry_entity.lower()
-        found_pattern = None
-
-        for key, value in our_entity_patterns.items():
-            if key in entity_lower:
-                found_pattern = value
-                break
+        # Fuzzy keys are tried in table order, so "home" wins over later stems
+        ("sensor.home_battery_energy_out", "home_usage_daily"),
+        # Priority patterns are checked before the fuzzy table
+        ("sensor.home_battery_discharge", "battery_discharged_daily"),
+        ("sensor.tesla_site_grid_energy_total", None),
+    ],
+)
+def test_entity_pattern_matching(teslemetry_entity, expected_pattern):
+    """Test that entity pattern matching works correctly."""
+    found_pattern = _match_tesla_entity_to_mapping(
+        teslemetry_entity, None, _PATTERN_TO_TARGET
+    )
 
-        assert found_pattern == expected_pattern, (
-            f"Failed to match {teslemetry_entity} to {expected_pattern}"
-        )
+    assert found_pattern == expected_pattern, (
+        f"Failed to match {teslemetry_entity} to {expected_pattern}"
+    )
 
 
-def test_service_data_format():
+async def test_service_data_format(hass_async_call):
     """Test that service data is formatted correctly for both services."""
 
     # Test migration service data format
@@ -483,61 +696,42 @@ def test_service_data_format():
     }
 
     # Verify all expected fields are present
-    expected_fields = [
-        "auto_discover",
-        "entity_mapping",
-        "start_date",
-        "end_date",
-        "dry_run",
-        "overwrite_existing",
-        "merge_strategy",
-    ]
-    for field in expected_fields:
-        assert field in migration_data
+    assert _EXPECTED_MIGRATION_FIELDS <= migration_data.keys()
 
     # Test statistics data format conversion
-    input_stats = [
+    input_stat = {
+        "start": "2024-01-01T00:00:00+00:00",
+        "sum": 15.5,
+        "mean": 0.65,
+        "min": 0.0,
+        "max": 2.5,
+        "state": 3.1,
+        "last_reset": None,
+    }
+    await _import_statistics_via_spook(
+        hass_async_call,
+        "sensor.powerwall_dashboard_home_usage_daily",
+        _Entity("sensor.powerwall_dashboard_home_usage_daily"),
+        [input_stat],
+    )
+
+    # Every statistic type, including state, is kept; other keys are dropped
+    spook_stats = _service_data(hass_async_call.services.async_call.call_args)["stats"]
+    assert spook_stats == [
         {
             "start": "2024-01-01T00:00:00+00:00",
             "sum": 15.5,
             "mean": 0.65,
             "min": 0.0,
             "max": 2.5,
+            "state": 3.1,
         }
     ]
 
-    # This mimics the conversion logic in _import_statistics_via_spook
-    spook_stats = []
-    for stat in input_stats:
-        spook_stat = {"start": stat["start"]}
-
-        if "sum" in stat:
-            spook_stat["sum"] = stat["sum"]
-        if "mean" in stat:
-            spook_stat["mean"] = stat["mean"]
-        if "min" in stat:
-            spook_stat["min"] = stat["min"]
-        if "max" in stat:
-            spook_stat["max"] = stat["max"]
-
-        spook_stats.append(spook_stat)
-
-    # Verify conversion
-    assert len(spook_stats) == 1
-    assert spook_stats[0]["start"] == "2024-01-01T00:00:00+00:00"
-    assert spook_stats[0]["sum"] == 15.5
-    assert spook_stats[0]["mean"] == 0.65
-    assert spook_stats[0]["min"] == 0.0
-    assert spook_stats[0]["max"] == 2.5
-
-
-@pytest.mark.asyncio
-async def test_slugify_edge_cases():
-    """Test entity ID normalization with various edge cases."""
-    from homeassistant.util import slugify
 
-    # Test cases with actual slugify behavior
-    test_cases = [
+@pytest.mark.parametrize(
+    ("input_text", "expected"),
+    [
         ("7579 PW", "7579_pw"),
         ("Café München", "cafe_munchen"),
         ("Test's Name", "test_s_name"),  # Apostrophes become separate underscores
@@ -548,75 +742,77 @@ async def test_slugify_edge_cases():
         ("", ""),  # Empty string
         ("123", "123"),  # Numbers only
         ("PW_123", "pw_123"),  # Existing underscores
-    ]
-
-    for input_text, expected in test_cases:
-        result = slugify(input_text, separator="_")
-        assert result == expected, (
-            f"slugify('{input_text}') = '{result}', expected '{expected}'"
-        )
+    ],
+)
+def test_slugify_edge_cases(input_text, expected):
+    """Test entity ID normalization with various edge cases."""
+    result = slugify(input_text, separator="_")
+    assert result == expected, (
+        f"slugify('{input_text}') = '{result}', expected '{expected}'"
+    )
 
 
-@pytest.mark.asyncio
-async def test_sensor_prefix_matching_edge_cases(mock_hass, mock_entity_registry):
+@pytest.mark.parametrize(
+    ("pw_name", "expected_prefix"),
+    [
+        ("Café München", "cafe_munchen"),
+        ("Test's PW", "test_s_pw"),  # Apostrophes become underscores
+        ("PW-001.V2", "pw_001_v2"),
+        ("PowerWall  123", "powerwall_123"),
+    ],
+)
+async def test_sensor_prefix_matching_edge_cases(
+    mock_hass, mock_entity_registry, pw_name, expected_prefix
+):
     """Test sensor prefix matching with various edge cases."""
-    from custom_components.powerwall_dashboard_energy_import import (
-        _discover_teslemetry_entities,
+    # Setup config entry with edge case name that would previously fail
+    # with manual transformation
+    config_entry = _make_entry("test-entry-id", pw_name)
+    mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
+
+    # Add a test Tesla entity
+    _add_entities(mock_entity_registry, ["sensor.my_home_solar_energy"])
+
+    # Test discovery with entity prefix
+    mapping = await _discover_teslemetry_entities(
+        mock_hass, mock_entity_registry, config_entry, "my_home"
     )
 
-    # Test cases that would previously fail with manual transformation
-    edge_case_configs = [
-        {"pw_name": "Café München", "expected_prefix": "cafe_munchen"},
-        {
-            "pw_name": "Test's PW",
-            "expected_prefix": "test_s_pw",
-        },  # Apostrophes become underscores
-        {"pw_name": "PW-001.V2", "expected_prefix": "pw_001_v2"},
-        {"pw_name": "PowerWall  123", "expected_prefix": "powerwall_123"},
-    ]
+    # Should successfully map the entity with proper prefix normalization
+    expected_entity_id = f"sensor.{expected_prefix}_solar_generated_daily"
+    assert len(mapping) == 1
+    assert "sensor.my_home_solar_energy" in mapping
+    assert mapping["sensor.my_home_solar_energy"] == expected_entity_id
+
 
-    for config_data in edge_case_configs:
-        # Setup config entry with edge case name
-        config_entry = Mock()
-        config_entry.entry_id = "test-entry-id"
-        config_entry.data = config_data
-        mock_hass.config_entries.async_entries = Mock(return_value=[config_entry])
+async def test_discover_slugifies_pw_name_once(mock_hass):
+    """Test that the Powerwall name is slugified once, not per entity."""
+    _slug_pw.cache_clear()
 
-        # Add a test Tesla entity
-        tesla_entity = Mock()
-        tesla_entity.entity_id = "sensor.my_home_solar_energy"
-        mock_entity_registry.entities = {"sensor.my_home_solar_energy": tesla_entity}
+    config_entry = _make_entry("test-entry-id", "Café München")
+    registry = _make_registry()
+    _add_entities(
+        registry, ["sensor.my_home_solar_energy", "sensor.my_home_grid_exported"]
+    )
 
-        # Test discovery with entity prefix
+    for _ in range(2):
         mapping = await _discover_teslemetry_entities(
-            mock_hass, mock_entity_registry, config_entry, "my_home"
+            mock_hass, registry, config_entry, "my_home"
         )
+        assert len(mapping) == 2
 
-        # Should successfully map the entity with proper prefix normalization
-        expected_entity_id = (
-            f"sensor.{config_data['expected_prefix']}_solar_generated_daily"
-        )
-        assert len(mapping) == 1
-        assert "sensor.my_home_solar_energy" in mapping
-        assert mapping["sensor.my_home_solar_energy"] == expected_entity_id
+    info = _slug_pw.cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
 
 
-def test_teslemetry_patterns_include_main_sensors():
+def test_teslemetry_patterns_include_main_sensors(teslemetry_patterns):
     """Test that Teslemetry patterns include main sensor mappings (currently failing)."""
     # This test will initially fail - we need to add main sensor mappings
-    _, our_entity_patterns = _get_teslemetry_patterns()
+    _, our_entity_patterns = teslemetry_patterns
 
     # Check specific keys have main sensor alternatives
-    expected_main_entries = [
-        ("home_main", "home_usage"),
-        ("solar_main", "solar_generated"),
-        ("battery_charge_main", "battery_charged"),
-        ("battery_discharge_main", "battery_discharged"),
-        ("grid_import_main", "grid_imported"),
-        ("grid_export_main", "grid_exported"),
-    ]
-
-    for pattern, expected_main in expected_main_entries:
+    for pattern, expected_main in _EXPECTED_MAIN_ENTRIES:
         assert pattern in our_entity_patterns, (
             f"Main pattern {pattern} missing from our_entity_patterns"
         )
@@ -625,22 +821,13 @@ def test_teslemetry_patterns_include_main_sensors():
         )
 
 
-def test_teslemetry_patterns_include_monthly_sensors():
+def test_teslemetry_patterns_include_monthly_sensors(teslemetry_patterns):
     """Test that Teslemetry patterns include monthly sensor mappings (currently failing)."""
     # This test will initially fail - we need to add monthly sensor mappings
-    _, our_entity_patterns = _get_teslemetry_patterns()
+    _, our_entity_patterns = teslemetry_patterns
 
     # Check specific keys have monthly sensor alternatives
-    expected_monthly_entries = [
-        ("home_monthly", "home_usage_monthly"),
-        ("solar_monthly", "solar_generated_monthly"),
-        ("battery_charge_monthly", "battery_charged_monthly"),
-        ("battery_discharge_monthly", "battery_discharged_monthly"),
-        ("grid_import_monthly", "grid_imported_monthly"),
-        ("grid_export_monthly", "grid_exported_monthly"),
-    ]
-
-    for pattern, expected_monthly in expected_monthly_entries:
+    for pattern, expected_monthly in _EXPECTED_MONTHLY_ENTRIES:
         assert pattern in our_entity_patterns, (
             f"Monthly pattern {pattern} missing from our_entity_patterns"
         )
@@ -649,21 +836,12 @@ def test_teslemetry_patterns_include_monthly_sensors():
         )
 
 
-def test_teslemetry_patterns_preserve_daily_sensors():
+def test_teslemetry_patterns_preserve_daily_sensors(teslemetry_patterns):
     """Test that Teslemetry patterns still include existing daily sensor mappings."""
     # These should continue to work
-    _, our_entity_patterns = _get_teslemetry_patterns()
-
-    expected_daily_mappings = {
-        "home": "home_usage_daily",
-        "solar": "solar_generated_daily",
-        "battery_charge": "battery_charged_daily",
-        "battery_discharge": "battery_discharged_daily",
-        "grid_import": "grid_imported_daily",
-        "grid_export": "grid_exported_daily",
-    }
+    _, our_entity_patterns = teslemetry_patterns
 
-    for pattern, expected_daily in expected_daily_mappings.items():
+    for pattern, expected_daily in _EXPECTED_DAILY_MAPPINGS:
         assert pattern in our_entity_patterns, (
             f"Pattern {pattern} missing from our_entity_patterns"
         )